@@ -1,33 +1,78 @@
 import os
-from sqlalchemy import create_engine
+from asyncio import current_task
+from sqlalchemy import DateTime, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, async_scoped_session, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 if DATABASE_URL:
-    # Production with Postgres (Railway)
+    # Production with Postgres (Railway) via asyncpg
     if DATABASE_URL.startswith("postgres://"):
-        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://")
-    engine = create_engine(DATABASE_URL)
+        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+asyncpg://", 1)
+    elif DATABASE_URL.startswith("postgresql://"):
+        DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+    # Prepared statement caches let repeated queries skip the parse step.
+    # Set to 0 when running behind pgbouncer in transaction pooling mode.
+    STATEMENT_CACHE_SIZE = int(os.getenv("DATABASE_STATEMENT_CACHE_SIZE", "500"))
+    # Pooled connections so requests don't pay a TCP/SSL handshake each time
+    engine = create_async_engine(
+        DATABASE_URL,
+        pool_size=20,
+        max_overflow=10,
+        pool_timeout=30,
+        pool_pre_ping=True,
+        connect_args={
+            "prepared_statement_cache_size": STATEMENT_CACHE_SIZE,
+            "statement_cache_size": STATEMENT_CACHE_SIZE,
+        },
+    )
 else:
     # Local development with SQLite
-    SQLITE_DATABASE_URL = "sqlite:///./agent_ops.db"
-    engine = create_engine(SQLITE_DATABASE_URL, connect_args={"check_same_thread": False})
+    SQLITE_DATABASE_URL = "sqlite+aiosqlite:///./agent_ops.db"
+    engine = create_async_engine(SQLITE_DATABASE_URL, connect_args={"check_same_thread": False})
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+# One session per asyncio task, so everything a request does shares a single
+# session and identity map
+ScopedSession = async_scoped_session(SessionLocal, scopefunc=current_task)
 Base = declarative_base()
 
-def get_db_session():
+async def get_db_session():
     """Dependency to get database session"""
-    db = SessionLocal()
     try:
-        yield db
+        yield ScopedSession()
     finally:
-        db.close()
+        await ScopedSession.remove()
 
-def init_db():
+async def init_db():
     """Initialize database tables"""
     from models import Job, Output  # Import here to avoid circular imports
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_migrate_timestamp_columns)
+        await conn.run_sync(_create_missing_indexes)
+
+def _create_missing_indexes(conn):
+    """Add indexes declared after a table was first created (create_all skips existing tables)"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+def _migrate_timestamp_columns(conn):
+    """Convert naive timestamp columns from older deployments to timestamptz (stored values are UTC)"""
+    if conn.dialect.name != "postgresql":
+        return
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {col["name"]: col["type"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if not isinstance(column.type, DateTime) or not column.type.timezone:
+                continue
+            current = existing.get(column.name)
+            if isinstance(current, DateTime) and not current.timezone:
+                conn.execute(text(
+                    f'ALTER TABLE "{table.name}" ALTER COLUMN "{column.name}" '
+                    f'TYPE TIMESTAMP WITH TIME ZONE USING "{column.name}" AT TIME ZONE \'UTC\''
+                ))
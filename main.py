@@ -1,23 +1,24 @@
 import os
-import uuid
-import json
+import orjson
 import logging
 import time
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from typing import Optional, Dict, Any, List
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-import asyncio
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from db import get_db_session, init_db
-from models import Job, Output, JobStatus, JobType
-from services.generators import generate_lead_list, generate_prompt_pack, generate_weekly_pilot_memo, generate_research_brief
-from services.llm import generate, LLMError
+from db import SessionLocal, engine, get_db_session, init_db
+from models import Job, Output, JobStatus, JobType, uuid7
+from services.llm import agenerate, LLMError
+from services.slush_api import close_http_client
+from worker import init_queue, close_queue, enqueue_job
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -27,9 +28,13 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    init_db()
+    await init_db()
+    await init_queue()
     yield
-    # Shutdown (if needed)
+    # Shutdown
+    await close_queue()
+    await close_http_client()
+    await engine.dispose()
 
 # Initialize FastAPI app
 app = FastAPI(title="Agent Ops Backend", version="1.0.0", lifespan=lifespan)
@@ -56,10 +61,11 @@ def verify_api_key(credentials: HTTPAuthorizationCredentials = Depends(security)
 # Request logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
     response = await call_next(request)
-    process_time = time.time() - start_time
-    logger.info(f"{request.method} {request.url.path} - {response.status_code} - {process_time:.4f}s")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("%s %s - %d - %.4fs", request.method, request.url.path, response.status_code,
+                    (time.perf_counter_ns() - start_ns) / 1e9)
     return response
 
 # Pydantic models
@@ -68,6 +74,8 @@ class CreateJobRequest(BaseModel):
     params: Dict[str, Any]
 
 class JobResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
     id: str
     type: str
     status: str
@@ -78,7 +86,13 @@ class JobResponse(BaseModel):
     finished_at: Optional[datetime]
     error_text: Optional[str]
 
+class JobListResponse(BaseModel):
+    items: List[JobResponse]
+    next_cursor: Optional[str]
+
 class OutputResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
     id: int
     job_id: str
     type: str
@@ -86,6 +100,10 @@ class OutputResponse(BaseModel):
     content_type: str
     created_at: datetime
 
+class HealthResponse(BaseModel):
+    status: str
+    timestamp: datetime
+
 class ChatRequest(BaseModel):
     message: str
 
@@ -94,234 +112,179 @@ class ChatResponse(BaseModel):
 
 
 # Health check endpoint (no auth required)
-@app.get("/health")
+@app.get("/health", response_model=HealthResponse)
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now(timezone.utc)}
 
-# Job execution function
-async def execute_job(job_id: str, job_type: JobType, params: Dict[str, Any]):
-    """Execute job in background and update status"""
-    db = next(get_db_session())
-    
-    try:
-        # Update job to running
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if not job:
-            return
-        
-        job.status = JobStatus.RUNNING.value
-        job.started_at = datetime.now(timezone.utc)
-        db.commit()
-        
-        # Generate content based on job type
-        if job_type == JobType.LEAD_LIST:
-            content = generate_lead_list(params)  # DEPRECATED - returns notice
-        elif job_type == JobType.PROMPT_PACK:
-            content = generate_prompt_pack(params)
-        elif job_type == JobType.WEEKLY_PILOT_MEMO:
-            content = await generate_weekly_pilot_memo(params)
-        elif job_type == JobType.RESEARCH_BRIEF:
-            content = generate_research_brief(params)
-        else:
-            raise ValueError(f"Unknown job type: {job_type}")
-        
-        # Store output
-        output = Output(
-            job_id=job_id,
-            type=job_type.value,
-            content_text=content,
-            content_type="text/markdown"
-        )
-        db.add(output)
-        
-        # Update job to succeeded
-        job.status = JobStatus.SUCCEEDED.value
-        job.finished_at = datetime.now(timezone.utc)
-        db.commit()
-        
-    except Exception as e:
-        # Update job to failed
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if job:
-            job.status = JobStatus.FAILED.value
-            job.error_text = str(e)
-            job.finished_at = datetime.now(timezone.utc)
-            db.commit()
-        logger.error(f"Job {job_id} failed: {str(e)}")
-    
-    finally:
-        db.close()
-
 # Create job endpoint
 @app.post("/jobs", response_model=JobResponse, dependencies=[Depends(verify_api_key)])
-async def create_job(request: CreateJobRequest):
-    db = next(get_db_session())
+async def create_job(request: CreateJobRequest, db: AsyncSession = Depends(get_db_session)):
+    # Create job record
+    job_id = uuid7().hex
+    now = datetime.now(timezone.utc)
+    job = Job(
+        id=job_id,
+        type=request.type.value,
+        status=JobStatus.QUEUED.value,
+        params_json=orjson.dumps(request.params).decode(),
+        created_at=now,
+        updated_at=now
+    )
+    db.add(job)
+    await db.commit()
     
-    try:
-        # Create job record
-        job_id = str(uuid.uuid4())
-        job = Job(
-            id=job_id,
-            type=request.type.value,
-            status=JobStatus.QUEUED.value,
-            params_json=json.dumps(request.params)
-        )
-        db.add(job)
-        db.commit()
-        
-        # Execute job in background
-        asyncio.create_task(execute_job(job_id, request.type, request.params))
-        
-        # Return job response
-        return JobResponse(
-            id=job.id,
-            type=job.type,
-            status=job.status,
-            params_json=job.params_json,
-            created_at=job.created_at,
-            updated_at=job.updated_at,
-            started_at=job.started_at,
-            finished_at=job.finished_at,
-            error_text=job.error_text
-        )
+    # Hand off to the job worker
+    await enqueue_job(job_id, request.type, request.params)
     
-    finally:
-        db.close()
+    return job
 
-# Get all jobs endpoint
-@app.get("/jobs", response_model=List[JobResponse], dependencies=[Depends(verify_api_key)])
-async def get_jobs():
-    db = next(get_db_session())
-    
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def encode_jobs_cursor(job: Job) -> str:
+    """Opaque "<created_at epoch microseconds>_<id>" cursor for a job"""
+    created_at = job.created_at
+    if created_at.tzinfo is None:
+        # SQLite returns naive datetimes; stored values are UTC
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return f"{(created_at - _EPOCH) // timedelta(microseconds=1)}_{job.id}"
+
+def decode_jobs_cursor(cursor: str):
+    """Parse a cursor from encode_jobs_cursor into (created_at, id)"""
     try:
-        jobs = db.query(Job).order_by(Job.created_at.desc()).all()
-        return [
-            JobResponse(
-                id=job.id,
-                type=job.type,
-                status=job.status,
-                params_json=job.params_json,
-                created_at=job.created_at,
-                updated_at=job.updated_at,
-                started_at=job.started_at,
-                finished_at=job.finished_at,
-                error_text=job.error_text
-            ) for job in jobs
-        ]
+        micros, job_id = cursor.split("_", 1)
+        if not job_id:
+            raise ValueError("cursor has no job id")
+        return _EPOCH + timedelta(microseconds=int(micros)), job_id
+    except (ValueError, OverflowError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# List jobs endpoint (newest first, keyset-paginated on (created_at, id))
+@app.get("/jobs", response_model=JobListResponse, dependencies=[Depends(verify_api_key)])
+async def get_jobs(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db_session),
+):
+    # id (time-ordered uuid7) breaks ties between jobs created in the same microsecond
+    query = select(Job).order_by(Job.created_at.desc(), Job.id.desc()).limit(limit)
+    if cursor:
+        query = query.where(tuple_(Job.created_at, Job.id) < tuple_(*decode_jobs_cursor(cursor)))
+    jobs = (await db.execute(query)).scalars().all()
     
-    finally:
-        db.close()
+    # A short page means there is nothing left to fetch
+    next_cursor = encode_jobs_cursor(jobs[-1]) if len(jobs) == limit else None
+    return JobListResponse(items=jobs, next_cursor=next_cursor)
 
 # Get specific job endpoint
 @app.get("/jobs/{job_id}", response_model=JobResponse, dependencies=[Depends(verify_api_key)])
-async def get_job(job_id: str):
-    db = next(get_db_session())
+async def get_job(job_id: str, db: AsyncSession = Depends(get_db_session)):
+    job = (await db.execute(select(Job).where(Job.id == job_id))).scalar_one_or_none()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
     
-    try:
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if not job:
-            raise HTTPException(status_code=404, detail="Job not found")
-        
-        return JobResponse(
-            id=job.id,
-            type=job.type,
-            status=job.status,
-            params_json=job.params_json,
-            created_at=job.created_at,
-            updated_at=job.updated_at,
-            started_at=job.started_at,
-            finished_at=job.finished_at,
-            error_text=job.error_text
-        )
-    
-    finally:
-        db.close()
+    return job
 
 # Get job output endpoint
 @app.get("/jobs/{job_id}/output", response_model=OutputResponse, dependencies=[Depends(verify_api_key)])
-async def get_job_output(job_id: str):
-    db = next(get_db_session())
+async def get_job_output(job_id: str, db: AsyncSession = Depends(get_db_session)):
+    output = (await db.execute(select(Output).where(Output.job_id == job_id).limit(1))).scalar_one_or_none()
+    if not output:
+        raise HTTPException(status_code=404, detail="Output not found")
     
-    try:
-        output = db.query(Output).filter(Output.job_id == job_id).first()
-        if not output:
-            raise HTTPException(status_code=404, detail="Output not found")
-        
-        return OutputResponse(
-            id=output.id,
-            job_id=output.job_id,
-            type=output.type,
-            content_text=output.content_text,
-            content_type=output.content_type,
-            created_at=output.created_at
-        )
+    return output
+
+# Raw output is streamed in slices so large documents never sit in memory whole
+OUTPUT_STREAM_CHUNK_CHARS = 64 * 1024
+
+async def stream_output_text(output_id: int, length: int):
+    """Yield an output's content_text in chunks read with SQL substr"""
+    # The request-scoped session is gone once streaming starts, so use our own
+    async with SessionLocal() as db:
+        for start in range(1, length + 1, OUTPUT_STREAM_CHUNK_CHARS):
+            chunk = (await db.execute(
+                select(func.substr(Output.content_text, start, OUTPUT_STREAM_CHUNK_CHARS)).where(Output.id == output_id)
+            )).scalar()
+            if not chunk:
+                break
+            yield chunk
+
+# Stream raw job output endpoint
+@app.get("/jobs/{job_id}/output/raw", dependencies=[Depends(verify_api_key)])
+async def get_job_output_raw(job_id: str, db: AsyncSession = Depends(get_db_session)):
+    row = (await db.execute(
+        select(Output.id, Output.content_type, func.length(Output.content_text))
+        .where(Output.job_id == job_id)
+        .limit(1)
+    )).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Output not found")
     
-    finally:
-        db.close()
+    output_id, content_type, length = row
+    return StreamingResponse(stream_output_text(output_id, length), media_type=content_type)
 
 # Get latest output by type endpoint
 @app.get("/outputs/latest", response_model=OutputResponse, dependencies=[Depends(verify_api_key)])
-async def get_latest_output(type: str):
-    db = next(get_db_session())
+async def get_latest_output(type: str, db: AsyncSession = Depends(get_db_session)):
+    output = (await db.execute(
+        select(Output).where(Output.type == type).order_by(Output.created_at.desc()).limit(1)
+    )).scalar_one_or_none()
+    if not output:
+        raise HTTPException(status_code=404, detail="Output not found")
     
-    try:
-        output = db.query(Output).filter(Output.type == type).order_by(Output.created_at.desc()).first()
-        if not output:
-            raise HTTPException(status_code=404, detail="Output not found")
-        
-        return OutputResponse(
-            id=output.id,
-            job_id=output.job_id,
-            type=output.type,
-            content_text=output.content_text,
-            content_type=output.content_type,
-            created_at=output.created_at
-        )
-    
-    finally:
-        db.close()
+    return output
+
+# Characters of the generated output included as chat context
+CHAT_OUTPUT_CONTEXT_CHARS = 2000
 
 # Chat with job output endpoint
 @app.post("/jobs/{job_id}/chat", response_model=ChatResponse, dependencies=[Depends(verify_api_key)])
-async def chat_with_job(job_id: str, request: ChatRequest):
-    db = next(get_db_session())
-    
+async def chat_with_job(job_id: str, request: ChatRequest, db: AsyncSession = Depends(get_db_session)):
     try:
-        # Get the job and its output
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if not job:
+        # Get the job and a truncated view of its output in a single round trip;
+        # only the first CHAT_OUTPUT_CONTEXT_CHARS characters leave the database
+        row = (await db.execute(
+            select(
+                Job,
+                Output.id,
+                func.substr(Output.content_text, 1, CHAT_OUTPUT_CONTEXT_CHARS),
+                func.length(Output.content_text),
+            )
+            .outerjoin(Output, Output.job_id == Job.id)
+            .where(Job.id == job_id)
+            .limit(1)
+        )).first()
+        if not row:
             raise HTTPException(status_code=404, detail="Job not found")
         
-        output = db.query(Output).filter(Output.job_id == job_id).first()
-        if not output:
+        job, output_id, output_snippet, output_length = row
+        if output_id is None:
             raise HTTPException(status_code=404, detail="Job output not found")
         
         # Build context from original job and output
-        job_params = json.loads(job.params_json)
+        job_params = orjson.loads(job.params_json)
         
         system_prompt = f"""You are continuing a conversation about a {job.type} that was previously generated. 
         
 The user is asking a follow-up question about this output. Provide a helpful response based on the context.
 
 Original Job Type: {job.type}
-Original Parameters: {json.dumps(job_params, indent=2)}
-Generated Output: {output.content_text[:2000]}{'...' if len(output.content_text) > 2000 else ''}"""
+Original Parameters: {orjson.dumps(job_params, option=orjson.OPT_INDENT_2).decode()}
+Generated Output: {output_snippet}{'...' if output_length > CHAT_OUTPUT_CONTEXT_CHARS else ''}"""
 
         user_prompt = f"Follow-up question: {request.message}"
         
         # Generate response
-        reply = generate(system_prompt, user_prompt)
+        reply = await agenerate(system_prompt, user_prompt)
         
         return ChatResponse(reply=reply)
         
+    except HTTPException:
+        raise
     except LLMError as e:
         raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
     except Exception as e:
-        logger.error(f"Error in chat endpoint: {str(e)}")
+        logger.exception(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
-    
-    finally:
-        db.close()
 
 if __name__ == "__main__":
     import uvicorn
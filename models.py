@@ -1,9 +1,25 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from enum import Enum
+import os
+import time
+import uuid
 from db import Base
 
+def uuid7() -> uuid.UUID:
+    """Time-ordered UUID (RFC 9562 version 7) so new job ids append to the end of the PK index"""
+    if hasattr(uuid, "uuid7"):  # Python 3.14+
+        return uuid.uuid7()
+    timestamp_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (timestamp_ms & 0xFFFF_FFFF_FFFF) << 80  # 48-bit unix_ts_ms
+    value |= 0x7 << 76                                # version
+    value |= ((rand >> 62) & 0xFFF) << 64             # 12-bit rand_a
+    value |= 0b10 << 62                               # variant
+    value |= rand & ((1 << 62) - 1)                   # 62-bit rand_b
+    return uuid.UUID(int=value)
+
 class JobStatus(Enum):
     QUEUED = "queued"
     RUNNING = "running"
@@ -18,15 +34,19 @@ class JobType(Enum):
 
 class Job(Base):
     __tablename__ = "jobs"
+    __table_args__ = (
+        # Serves the (created_at, id) keyset pagination of GET /jobs
+        Index("ix_jobs_created_id", "created_at", "id"),
+    )
     
-    id = Column(String, primary_key=True)
+    id = Column(String(32), primary_key=True)  # uuid7().hex
     type = Column(String, nullable=False)
     status = Column(String, nullable=False, default=JobStatus.QUEUED.value)
     params_json = Column(Text, nullable=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
-    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
-    started_at = Column(DateTime)
-    finished_at = Column(DateTime)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
     error_text = Column(Text)
     
     # Relationship to outputs
@@ -34,13 +54,17 @@ class Job(Base):
 
 class Output(Base):
     __tablename__ = "outputs"
+    __table_args__ = (
+        # Serves /outputs/latest (filter by type, newest first)
+        Index("ix_outputs_type_created", "type", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    job_id = Column(String, ForeignKey("jobs.id"), nullable=False)
+    job_id = Column(String, ForeignKey("jobs.id"), nullable=False, index=True)
     type = Column(String, nullable=False)
     content_text = Column(Text, nullable=False)
     content_type = Column(String, nullable=False, default="text/markdown")
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
     
     # Relationship to job
     job = relationship("Job", back_populates="outputs")
\ No newline at end of file
@@ -97,7 +97,7 @@ echo ""
 
 # Check all jobs status
 echo "6️⃣  Checking all jobs status..."
-curl -s "$BASE_URL/jobs" -H "$AUTH" | jq '.[] | {id, type, status}' || echo "❌ Jobs list failed"
+curl -s "$BASE_URL/jobs" -H "$AUTH" | jq '.items[] | {id, type, status}' || echo "❌ Jobs list failed"
 echo ""
 
 # Get outputs for each job type
@@ -4,8 +4,13 @@ Provides secure access to files under ai_sandbox/ with path traversal protection
 """
 
 import os
+import re
+import mmap
+import stat
 import logging
-from typing import Optional
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Iterable, Mapping, Tuple, Union
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -15,11 +20,47 @@ class FileLoaderError(Exception):
     pass
 
 MAX_FILE_SIZE = 2 * 1024 * 1024  # 2MB limit
+MMAP_THRESHOLD = 256 * 1024  # Larger files are decoded straight from a memory map
 ALLOWED_DIRECTORIES = {
     "repo_snapshots": "../ai_sandbox/repo_snapshots/",
     "pilot_data_exports": "../ai_sandbox/pilot_data_exports/", 
     "outputs": "../ai_sandbox/outputs/"
 }
+# Job parameter names that reference a file, and the directory each lives in
+PARAM_TO_DIR = {
+    "repo_snapshot_key": "repo_snapshots",
+    "data_export_key": "pilot_data_exports",
+    "notes_key": "outputs"
+}
+
+# Precomputed once at import: key validator and resolved base directories
+_INVALID_KEY = re.compile(r'[\\/]|\.\.')
+_RESOLVED_BASES = {name: Path(path).resolve() for name, path in ALLOWED_DIRECTORIES.items()}
+
+@functools.lru_cache(maxsize=64)
+def _read_cached(path: str, mtime_ns: int, size: int) -> str:
+    """
+    Read and decode a file, memoized on (path, mtime, size)
+    
+    A changed file gets a new mtime/size and therefore a new cache entry,
+    so stale content is never served. Worst case memory is 64 x MAX_FILE_SIZE.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if size > MMAP_THRESHOLD:
+            # Decode directly from the mapped pages, skipping the intermediate bytes copy
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+                return str(mm, 'utf-8')
+        raw = os.read(fd, size)
+        while len(raw) < size:
+            # Short reads are rare (network filesystems); finish up to EOF
+            chunk = os.read(fd, size - len(raw))
+            if not chunk:
+                break
+            raw += chunk
+    finally:
+        os.close(fd)
+    return raw.decode('utf-8')
 
 def load_file(directory_type: str, file_key: str) -> Optional[str]:
     """
@@ -41,48 +82,47 @@ def load_file(directory_type: str, file_key: str) -> Optional[str]:
         raise FileLoaderError(f"Invalid directory type: {directory_type}")
     
     # Prevent path traversal attacks
-    if ".." in file_key or "/" in file_key or "\\" in file_key:
+    if _INVALID_KEY.search(file_key):
         raise FileLoaderError("Invalid file key: path traversal not allowed")
     
     # Build safe file path
-    base_dir = ALLOWED_DIRECTORIES[directory_type]
-    file_path = Path(base_dir) / file_key
+    allowed_base = _RESOLVED_BASES[directory_type]
+    file_path = allowed_base / file_key
     
     # Resolve path and ensure it's still within allowed directory
     try:
         resolved_path = file_path.resolve()
-        allowed_base = Path(base_dir).resolve()
         
         # Check that resolved path is within allowed directory
-        if not str(resolved_path).startswith(str(allowed_base)):
+        if not resolved_path.is_relative_to(allowed_base):
             raise FileLoaderError("Path traversal attempt detected")
             
     except Exception as e:
         logger.error(f"Path resolution error: {str(e)}")
         raise FileLoaderError("Invalid file path")
     
-    # Check if file exists
-    if not resolved_path.exists():
+    # A single stat answers existence, file type, size and mtime
+    try:
+        file_stat = os.stat(resolved_path)
+    except FileNotFoundError:
         logger.info(f"File not found: {resolved_path}")
         return None
+    except OSError as e:
+        logger.error(f"Error accessing file: {str(e)}")
+        raise FileLoaderError("Error accessing file")
     
     # Check if it's actually a file
-    if not resolved_path.is_file():
+    if not stat.S_ISREG(file_stat.st_mode):
         raise FileLoaderError("Path is not a file")
     
     # Check file size
-    try:
-        file_size = resolved_path.stat().st_size
-        if file_size > MAX_FILE_SIZE:
-            raise FileLoaderError(f"File too large: {file_size} bytes (max: {MAX_FILE_SIZE})")
-    except Exception as e:
-        logger.error(f"Error checking file size: {str(e)}")
-        raise FileLoaderError("Error accessing file")
+    file_size = file_stat.st_size
+    if file_size > MAX_FILE_SIZE:
+        raise FileLoaderError(f"File too large: {file_size} bytes (max: {MAX_FILE_SIZE})")
     
-    # Read file content
+    # Read file content (cache hits skip the open/read entirely)
     try:
-        with open(resolved_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        content = _read_cached(str(resolved_path), file_stat.st_mtime_ns, file_size)
             
         logger.info(f"Successfully loaded file: {resolved_path} ({len(content)} characters)")
         return content
@@ -93,30 +133,36 @@ def load_file(directory_type: str, file_key: str) -> Optional[str]:
         logger.error(f"Error reading file: {str(e)}")
         raise FileLoaderError("Error reading file content")
 
-def load_multiple_files(file_refs: dict) -> dict:
+def load_multiple_files(file_refs: Union[Mapping[str, str], Iterable[Tuple[str, str]]]) -> Dict[str, str]:
     """
     Load multiple files based on parameter references
     
     Args:
-        file_refs: Dict with keys like 'repo_snapshot_key', 'data_export_key', 'notes_key'
-                  and values as file keys
+        file_refs: Dict or iterable of (name, value) pairs with names like
+                  'repo_snapshot_key', 'data_export_key', 'notes_key' and values
+                  as file keys; other names (e.g. full job params) are ignored
     
     Returns:
         Dict with loaded file contents, keyed by reference type
     """
     loaded_files = {}
     
-    # Map parameter names to directory types
-    param_to_dir = {
-        "repo_snapshot_key": "repo_snapshots",
-        "data_export_key": "pilot_data_exports", 
-        "notes_key": "outputs"
-    }
+    if isinstance(file_refs, Mapping):
+        file_refs = file_refs.items()
+    refs = [(param_name, file_key) for param_name, file_key in file_refs
+            if param_name in PARAM_TO_DIR and file_key]
+    if not refs:
+        return loaded_files
     
-    for param_name, file_key in file_refs.items():
-        if param_name in param_to_dir and file_key:
+    # Read all files concurrently; results are collected in reference order
+    # so the prompts built from them stay deterministic
+    with ThreadPoolExecutor(max_workers=len(refs)) as pool:
+        futures = [(param_name, file_key, pool.submit(load_file, PARAM_TO_DIR[param_name], file_key))
+                   for param_name, file_key in refs]
+        
+        for param_name, file_key, future in futures:
             try:
-                content = load_file(param_to_dir[param_name], file_key)
+                content = future.result()
                 if content:
                     loaded_files[param_name] = content
                     logger.info(f"Loaded {param_name}: {file_key}")
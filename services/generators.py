@@ -12,61 +12,52 @@ All generators follow anti-noise output rules:
 
 import logging
 import os
-from typing import Dict, Any
+import functools
+from typing import Dict, Any, List, Final
 from datetime import datetime
 import asyncio
 
-from .llm import generate, LLMError
+from .llm import agenerate_structured, LLMError, TRUNCATION_NOTICE
 from .file_loader import load_multiple_files, FileLoaderError
 from .slush_api import fetch_slush_data_for_memo, SlushAPIError
 
 logger = logging.getLogger(__name__)
 
-def load_system_docs() -> str:
-    """Load system documentation for context"""
-    try:
-        system_docs_path = os.path.join(os.path.dirname(__file__), "..", "system_docs.md")
-        with open(system_docs_path, 'r', encoding='utf-8') as f:
-            return f.read()
-    except Exception as e:
-        logger.warning(f"Failed to load system docs: {str(e)}")
-        return "System documentation not available."
-
-def generate_lead_list(params: Dict[str, Any]) -> str:
-    """
-    DEPRECATED: Lead scraping functionality removed
-    Returns deprecation notice for compatibility
-    """
-    return """# Lead List Generation - DEPRECATED
-
-## Notice
-Lead scraping functionality has been deprecated and removed from Agent Ops Backend.
-
-This service now focuses exclusively on research and analysis workflows using Claude AI:
-- `prompt_pack`: Development planning and implementation guides
-- `weekly_pilot_memo`: Business performance analysis and strategic planning
-- `research_brief`: In-depth research analysis and findings
-
-Please use one of the supported job types for your analysis needs.
-
----
-*Service refocused on research workflows as of February 2026*"""
-
-def generate_prompt_pack(params: Dict[str, Any]) -> str:
-    """Generate implementation planning document using Claude"""
-    
-    # Extract required parameters
-    feature_name = params.get("feature_name", "Unnamed Feature")
-    feature_description = params.get("feature_description", "No description provided")
-    notes = params.get("notes", "")
-    source_context = params.get("source_context", "")
-    
-    # Load optional files
-    file_refs = {k: v for k, v in params.items() if k.endswith("_key") and v}
-    loaded_files = load_multiple_files(file_refs)
-    
-    # Build system prompt
-    system_prompt = """You are a senior technical architect creating implementation planning documents. 
+# Documents come back as typed fields via a forced tool call; the title and
+# Inputs Used section are rendered in Python from the job parameters
+_DOCUMENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "goal": {
+            "type": "string",
+            "description": "The single-sentence Goal",
+        },
+        "sections": {
+            "type": "array",
+            "description": "Every section after Inputs Used, in template order",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "heading": {"type": "string", "description": "Section heading text, without the leading ##"},
+                    "body": {"type": "string", "description": "Section content in markdown"},
+                },
+                "required": ["heading", "body"],
+            },
+        },
+    },
+    "required": ["goal", "sections"],
+}
+
+_STRUCTURED_OUTPUT_RULES = """
+
+Return the document by calling the submit_document tool:
+- goal: the single Goal sentence
+- sections: every section after Inputs Used, in the order shown above, each with its heading and markdown body
+The title and the Inputs Used section are added automatically; do not include them."""
+
+# Static system prompts for each generator; module-level so every job sends
+# the exact same bytes (a stable prompt-cache prefix)
+_PROMPT_PACK_SYSTEM = """You are a senior technical architect creating implementation planning documents. 
 
 When source_context is provided, focus on turning suggestions/experiments from memos or research into concrete prompts for a coding agent.
 When no source_context, focus on feature implementation planning.
@@ -79,7 +70,7 @@ Your output must follow this exact structure:
 [Single sentence describing implementation objective]
 
 ## Inputs Used
-[List each input source explicitly]
+[Added automatically]
 
 ## Context Summary
 [Brief description of what needs to be built/modified and why]
@@ -127,79 +118,9 @@ CRITICAL: Follow anti-noise rules:
 - Max 5 key implementation phases
 - Max 3 major edge cases  
 - Max 5 acceptance criteria
-- Be specific and actionable"""
-    
-    # Build user prompt - prioritize source_context
-    inputs_list = [f"Feature: {feature_name}"]
-    
-    if source_context:
-        inputs_list.append("Source context from memo/research")
-        user_prompt = f"Turn the following memo/research suggestions into concrete prompts for: {feature_name}\n\n"
-        user_prompt += f"## Source Context (Memo/Research Output):\n{source_context}\n\n"
-        user_prompt += f"Feature Description: {feature_description}\n"
-        if notes:
-            inputs_list.append(f"Additional notes: {notes}")
-            user_prompt += f"\nAdditional Context: {notes}\n"
-    else:
-        inputs_list.append(f"Description: {feature_description}")
-        if notes:
-            inputs_list.append(f"Additional notes: {notes}")
-        user_prompt = f"Create an implementation plan for: {feature_name}\n\nDescription: {feature_description}\n"
-        if notes:
-            user_prompt += f"\nAdditional Context: {notes}\n"
-    
-    # Add file contents if available
-    if loaded_files:
-        user_prompt += "\n## Available Context Files:\n"
-        for file_ref, content in loaded_files.items():
-            inputs_list.append(f"File: {file_ref}")
-            file_type = file_ref.replace("_key", "")
-            user_prompt += f"\n### {file_type.title()}:\n{content[:2000]}{'...' if len(content) > 2000 else ''}\n"
-    
-    try:
-        result = generate(system_prompt, user_prompt)
-        
-        # Ensure proper inputs section
-        if "## Inputs Used" in result:
-            inputs_section = "\n".join([f"- {inp}" for inp in inputs_list])
-            result = result.replace("## Inputs Used\n[List each input source explicitly]", 
-                                  f"## Inputs Used\n{inputs_section}")
-        
-        return result
-        
-    except LLMError as e:
-        raise Exception(f"Failed to generate prompt pack: {str(e)}")
+- Be specific and actionable""" + _STRUCTURED_OUTPUT_RULES
 
-async def generate_weekly_pilot_memo(params: Dict[str, Any]) -> str:
-    """Generate weekly business analysis memo using Claude with real Slush data"""
-    
-    # Extract parameters
-    pilot_name = params.get("pilot_name", "Slush Operations")
-    week_start_date = params.get("week_start_date", datetime.now().strftime("%Y-%m-%d"))
-    notes = params.get("notes", "")
-    days_back = params.get("range_days", 7)  # Support both "range" and "range_days"
-    
-    # Handle legacy "range" parameter
-    if "range" in params and params["range"] == "last_7_days":
-        days_back = 7
-    
-    # Load optional files
-    file_refs = {k: v for k, v in params.items() if k.endswith("_key") and v}
-    loaded_files = load_multiple_files(file_refs)
-    
-    # Load system documentation
-    system_docs = load_system_docs()
-    
-    # Fetch real Slush business data
-    try:
-        slush_data = await fetch_slush_data_for_memo(days_back)
-        logger.info("Successfully fetched Slush data for weekly memo")
-    except Exception as e:
-        logger.warning(f"Failed to fetch Slush data: {str(e)}")
-        slush_data = "=== SLUSH DATA UNAVAILABLE ===\nMemo will be generated without real business data."
-    
-    # Build system prompt
-    system_prompt = """You are a business analyst creating weekly performance and strategy memos.
+_WEEKLY_MEMO_SYSTEM = """You are a business analyst creating weekly performance and strategy memos.
 
 Your output must follow this exact structure:
 
@@ -209,7 +130,7 @@ Your output must follow this exact structure:
 [Single sentence describing the memo's analytical objective]
 
 ## Inputs Used
-[List each input source explicitly]
+[Added automatically]
 
 ## KPI Snapshot
 - [Metric]: [Value] ([Change from last week])
@@ -261,71 +182,9 @@ CRITICAL: Follow anti-noise rules:
 - Exactly 3 experiments
 - Max 3 risks
 - Max 5 total action items
-- Max 3 questions"""
-    
-    # Build user prompt
-    inputs_list = [f"Pilot: {pilot_name}", f"Week of: {week_start_date}", "Real Slush business data", "System documentation"]
-    if notes:
-        inputs_list.append(f"Context notes: {notes}")
-    
-    user_prompt = f"Analyze the weekly performance for: {pilot_name}\nWeek starting: {week_start_date}\n"
-    
-    if notes:
-        user_prompt += f"\nAdditional Context: {notes}\n"
-    
-    # Add system documentation for context
-    user_prompt += f"\n## System Documentation:\n{system_docs}\n"
-    
-    # Add real Slush business data
-    user_prompt += f"\n## Real Business Data from Slush API:\n{slush_data}\n"
-    
-    # Add file contents if available  
-    if loaded_files:
-        user_prompt += "\n## Additional Data Files:\n"
-        for file_ref, content in loaded_files.items():
-            inputs_list.append(f"Data file: {file_ref}")
-            file_type = file_ref.replace("_key", "")
-            user_prompt += f"\n### {file_type.title()}:\n{content[:3000]}{'...' if len(content) > 3000 else ''}\n"
-    
-    user_prompt += "\nIMPORTANT: Base your analysis on the REAL business data provided above. Use actual metrics, identify real funnel drop-offs, and propose experiments based on the actual data patterns you see."
-    
-    try:
-        result = generate(system_prompt, user_prompt)
-        
-        # Ensure proper inputs section
-        if "## Inputs Used" in result:
-            inputs_section = "\n".join([f"- {inp}" for inp in inputs_list])
-            result = result.replace("## Inputs Used\n[List each input source explicitly]", 
-                                  f"## Inputs Used\n{inputs_section}")
-        
-        return result
-        
-    except LLMError as e:
-        raise Exception(f"Failed to generate weekly pilot memo: {str(e)}")
+- Max 3 questions""" + _STRUCTURED_OUTPUT_RULES
 
-def generate_research_brief(params: Dict[str, Any]) -> str:
-    """Generate research analysis brief using Claude"""
-    
-    # Extract required parameters
-    topic = params.get("topic", "Research Topic")
-    questions = params.get("questions", [])
-    context_notes = params.get("context_notes", "")
-    
-    # Handle questions as string or list
-    if isinstance(questions, str):
-        questions = [q.strip() for q in questions.split("\n") if q.strip()]
-    elif not isinstance(questions, list):
-        questions = []
-    
-    # Load optional files
-    file_refs = {k: v for k, v in params.items() if k.endswith("_key") and v}
-    loaded_files = load_multiple_files(file_refs)
-    
-    # Load system documentation
-    system_docs = load_system_docs()
-    
-    # Build system prompt
-    system_prompt = """You are a senior research analyst creating comprehensive research briefs.
+_RESEARCH_BRIEF_SYSTEM = """You are a senior research analyst creating comprehensive research briefs.
 
 Your output must follow this exact structure:
 
@@ -335,7 +194,7 @@ Your output must follow this exact structure:
 [Single sentence describing the research objective]
 
 ## Inputs Used
-[List each input source explicitly]
+[Added automatically]
 
 ## Research Questions
 1. [Primary question]
@@ -391,45 +250,256 @@ CRITICAL: Follow anti-noise rules:
 - Max 5 key findings
 - Max 3 critical decisions
 - Max 5 next actions total
-- Be specific and evidence-based"""
+- Be specific and evidence-based""" + _STRUCTURED_OUTPUT_RULES
+
+# Per-file context budgets, in estimated tokens
+PROMPT_PACK_FILE_TOKENS = 500
+CONTEXT_FILE_TOKENS = 750
+# Rough UTF-8 bytes per token for English text/markdown (same ratio llm.py
+# uses to convert the output character limit to max_tokens)
+_BYTES_PER_TOKEN = 4
+
+def truncate_to_token_budget(content: str, max_tokens: int) -> str:
+    """
+    Clip file content to an estimated token budget
+    
+    The cut is made on the UTF-8 encoding (what is actually sent and billed),
+    never splitting a multi-byte character. Only the first max_bytes characters
+    are encoded, so the cost is bounded by the budget, not the file size.
+    """
+    max_bytes = max_tokens * _BYTES_PER_TOKEN
+    # A character is at most 4 bytes, so short content fits without encoding
+    if len(content) * 4 <= max_bytes:
+        return content
+    # ...and at least 1 byte, so the cut always falls within the first max_bytes characters
+    encoded = content[:max_bytes].encode("utf-8")
+    if len(content) <= max_bytes and len(encoded) <= max_bytes:
+        return content
+    return encoded[:max_bytes].decode("utf-8", errors="ignore") + "..."
+
+def _files_block(title: str, loaded_files: Dict[str, str], input_label: str,
+                 inputs_list: List[str], max_tokens: int) -> str:
+    """Render loaded files as one context block, recording each in inputs_list"""
+    parts = [title]
+    for file_ref, content in loaded_files.items():
+        inputs_list.append(f"{input_label}: {file_ref}")
+        file_type = file_ref.replace("_key", "")
+        parts.append(f"\n### {file_type.title()}:\n{truncate_to_token_budget(content, max_tokens)}\n")
+    return "".join(parts)
+
+def _render_document(title: str, document: Dict[str, Any], inputs_list: List[str], truncated: bool) -> str:
+    """Render a structured document (validated against _DOCUMENT_SCHEMA) as markdown, with the actual inputs listed"""
+    # A truncated document may stop before "sections" (or even "goal") begins
+    parts = [f"# {title}", "", "## Goal", document.get("goal", "").strip(), "", "## Inputs Used"]
+    parts.extend([f"- {inp}" for inp in inputs_list])
+    for section in document.get("sections", []):
+        parts.extend(["", f"## {section['heading'].strip().lstrip('#').strip()}", section["body"].strip()])
+    rendered = "\n".join(parts)
+    return rendered + TRUNCATION_NOTICE if truncated else rendered
+
+@functools.lru_cache(maxsize=1)
+def _read_system_docs() -> str:
+    """Read system_docs.md once per process; call _read_system_docs.cache_clear() to reload"""
+    system_docs_path = os.path.join(os.path.dirname(__file__), "..", "system_docs.md")
+    with open(system_docs_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def load_system_docs() -> str:
+    """Load system documentation for context"""
+    try:
+        # Failures are not cached, so a missing file is retried on the next job
+        return _read_system_docs()
+    except Exception as e:
+        logger.warning(f"Failed to load system docs: {str(e)}")
+        return "System documentation not available."
+
+# Returned as-is for every (deprecated) lead_list job
+_DEPRECATED_LEAD_LIST_NOTICE: Final[str] = """# Lead List Generation - DEPRECATED
+
+## Notice
+Lead scraping functionality has been deprecated and removed from Agent Ops Backend.
+
+This service now focuses exclusively on research and analysis workflows using Claude AI:
+- `prompt_pack`: Development planning and implementation guides
+- `weekly_pilot_memo`: Business performance analysis and strategic planning
+- `research_brief`: In-depth research analysis and findings
+
+Please use one of the supported job types for your analysis needs.
+
+---
+*Service refocused on research workflows as of February 2026*"""
+
+def generate_lead_list(params: Dict[str, Any]) -> str:
+    """
+    DEPRECATED: Lead scraping functionality removed
+    Returns deprecation notice for compatibility
+    """
+    return _DEPRECATED_LEAD_LIST_NOTICE
+
+async def generate_prompt_pack(params: Dict[str, Any]) -> str:
+    """Generate implementation planning document using Claude"""
+    
+    # Extract required parameters
+    feature_name = params.get("feature_name", "Unnamed Feature")
+    feature_description = params.get("feature_description", "No description provided")
+    notes = params.get("notes", "")
+    source_context = params.get("source_context", "")
+    
+    # Load optional files (in a worker thread, off the event loop)
+    loaded_files = await asyncio.to_thread(load_multiple_files, params.items())
+    
+    # Build user prompt - prioritize source_context
+    inputs_list = [f"Feature: {feature_name}"]
+    
+    if source_context:
+        inputs_list.append("Source context from memo/research")
+        prompt_parts = [f"Turn the following memo/research suggestions into concrete prompts for: {feature_name}\n\n"]
+        prompt_parts.append(f"## Source Context (Memo/Research Output):\n{source_context}\n\n")
+        prompt_parts.append(f"Feature Description: {feature_description}\n")
+        if notes:
+            inputs_list.append(f"Additional notes: {notes}")
+            prompt_parts.append(f"\nAdditional Context: {notes}\n")
+    else:
+        inputs_list.append(f"Description: {feature_description}")
+        if notes:
+            inputs_list.append(f"Additional notes: {notes}")
+        prompt_parts = [f"Create an implementation plan for: {feature_name}\n\nDescription: {feature_description}\n"]
+        if notes:
+            prompt_parts.append(f"\nAdditional Context: {notes}\n")
+    
+    # Add file contents if available (sent as a prompt-cached system block)
+    cached_blocks = []
+    if loaded_files:
+        cached_blocks.append(_files_block(
+            "## Available Context Files:\n", loaded_files, "File", inputs_list, PROMPT_PACK_FILE_TOKENS
+        ))
+    
+    user_prompt = "".join(prompt_parts)
+    
+    try:
+        document, truncated = await agenerate_structured(_PROMPT_PACK_SYSTEM, user_prompt, _DOCUMENT_SCHEMA, cached_blocks)
+        return _render_document(f"Prompt Pack - {feature_name}", document, inputs_list, truncated)
+        
+    except LLMError as e:
+        raise Exception(f"Failed to generate prompt pack: {str(e)}")
+
+async def _fetch_slush_data(days_back: int) -> str:
+    """Fetch formatted Slush data for a memo, falling back to an unavailable notice"""
+    try:
+        slush_data = await fetch_slush_data_for_memo(days_back)
+        logger.info("Successfully fetched Slush data for weekly memo")
+        return slush_data
+    except Exception as e:
+        logger.warning(f"Failed to fetch Slush data: {str(e)}")
+        return "=== SLUSH DATA UNAVAILABLE ===\nMemo will be generated without real business data."
+
+async def generate_weekly_pilot_memo(params: Dict[str, Any]) -> str:
+    """Generate weekly business analysis memo using Claude with real Slush data"""
+    
+    # Extract parameters
+    pilot_name = params.get("pilot_name", "Slush Operations")
+    week_start_date = params.get("week_start_date", datetime.now().strftime("%Y-%m-%d"))
+    notes = params.get("notes", "")
+    days_back = params.get("range_days", 7)  # Support both "range" and "range_days"
+    
+    # Handle legacy "range" parameter
+    if "range" in params and params["range"] == "last_7_days":
+        days_back = 7
+    
+    # Load optional files (in a worker thread) while fetching real Slush business data
+    loaded_files, slush_data = await asyncio.gather(
+        asyncio.to_thread(load_multiple_files, params.items()),
+        _fetch_slush_data(days_back),
+    )
+    
+    # Load system documentation
+    system_docs = load_system_docs()
+    
+    # Build user prompt
+    inputs_list = [f"Pilot: {pilot_name}", f"Week of: {week_start_date}", "Real Slush business data", "System documentation"]
+    if notes:
+        inputs_list.append(f"Context notes: {notes}")
+    
+    prompt_parts = [f"Analyze the weekly performance for: {pilot_name}\nWeek starting: {week_start_date}\n"]
+    
+    if notes:
+        prompt_parts.append(f"\nAdditional Context: {notes}\n")
+    
+    # System documentation and data files are large and reused across jobs,
+    # so they are sent as prompt-cached system blocks
+    cached_blocks = [f"## System Documentation:\n{system_docs}\n"]
+    
+    # Add real Slush business data
+    prompt_parts.append(f"\n## Real Business Data from Slush API:\n{slush_data}\n")
+    
+    # Add file contents if available  
+    if loaded_files:
+        cached_blocks.append(_files_block(
+            "## Additional Data Files:\n", loaded_files, "Data file", inputs_list, CONTEXT_FILE_TOKENS
+        ))
+    
+    prompt_parts.append("\nIMPORTANT: Base your analysis on the REAL business data provided above. Use actual metrics, identify real funnel drop-offs, and propose experiments based on the actual data patterns you see.")
+    
+    user_prompt = "".join(prompt_parts)
+    
+    try:
+        document, truncated = await agenerate_structured(_WEEKLY_MEMO_SYSTEM, user_prompt, _DOCUMENT_SCHEMA, cached_blocks)
+        return _render_document(f"Weekly Pilot Memo - {pilot_name} - Week of {week_start_date}", document, inputs_list, truncated)
+        
+    except LLMError as e:
+        raise Exception(f"Failed to generate weekly pilot memo: {str(e)}")
+
+async def generate_research_brief(params: Dict[str, Any]) -> str:
+    """Generate research analysis brief using Claude"""
+    
+    # Extract required parameters
+    topic = params.get("topic", "Research Topic")
+    questions = params.get("questions", [])
+    context_notes = params.get("context_notes", "")
+    
+    # Handle questions as string or list
+    if isinstance(questions, str):
+        questions = [q.strip() for q in questions.split("\n") if q.strip()]
+    elif not isinstance(questions, list):
+        questions = []
+    
+    # Load optional files (in a worker thread, off the event loop)
+    loaded_files = await asyncio.to_thread(load_multiple_files, params.items())
+    
+    # Load system documentation
+    system_docs = load_system_docs()
     
     # Build user prompt
     inputs_list = [f"Topic: {topic}", "System documentation"]
     if context_notes:
         inputs_list.append(f"Context notes: {context_notes}")
     
-    user_prompt = f"Research analysis for: {topic}\n\n"
+    prompt_parts = [f"Research analysis for: {topic}\n\n"]
     
-    # Add system documentation for context
-    user_prompt += f"## System Documentation:\n{system_docs}\n\n"
+    # System documentation and research files are large and reused across
+    # jobs, so they are sent as prompt-cached system blocks
+    cached_blocks = [f"## System Documentation:\n{system_docs}\n"]
     
     if questions:
-        user_prompt += "Research Questions:\n"
+        prompt_parts.append("Research Questions:\n")
         for i, q in enumerate(questions[:5], 1):  # Max 5 questions
-            user_prompt += f"{i}. {q}\n"
-        user_prompt += "\n"
+            prompt_parts.append(f"{i}. {q}\n")
+        prompt_parts.append("\n")
     
     if context_notes:
-        user_prompt += f"Context: {context_notes}\n\n"
+        prompt_parts.append(f"Context: {context_notes}\n\n")
     
     # Add file contents if available
     if loaded_files:
-        user_prompt += "## Available Research Materials:\n"
-        for file_ref, content in loaded_files.items():
-            inputs_list.append(f"Research file: {file_ref}")
-            file_type = file_ref.replace("_key", "")
-            user_prompt += f"\n### {file_type.title()}:\n{content[:3000]}{'...' if len(content) > 3000 else ''}\n"
+        cached_blocks.append(_files_block(
+            "## Available Research Materials:\n", loaded_files, "Research file", inputs_list, CONTEXT_FILE_TOKENS
+        ))
+    
+    user_prompt = "".join(prompt_parts)
     
     try:
-        result = generate(system_prompt, user_prompt)
-        
-        # Ensure proper inputs section
-        if "## Inputs Used" in result:
-            inputs_section = "\n".join([f"- {inp}" for inp in inputs_list])
-            result = result.replace("## Inputs Used\n[List each input source explicitly]", 
-                                  f"## Inputs Used\n{inputs_section}")
-        
-        return result
+        document, truncated = await agenerate_structured(_RESEARCH_BRIEF_SYSTEM, user_prompt, _DOCUMENT_SCHEMA, cached_blocks)
+        return _render_document(f"Research Brief - {topic}", document, inputs_list, truncated)
         
     except LLMError as e:
         raise Exception(f"Failed to generate research brief: {str(e)}")
\ No newline at end of file
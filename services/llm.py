@@ -4,9 +4,14 @@ Integrates with Anthropic Claude API for research and analysis workflows.
 """
 
 import os
+import asyncio
+import hashlib
 import logging
-from typing import Optional
+import functools
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
 import anthropic
+import orjson
 from anthropic import APIError, APIConnectionError, APITimeoutError
 
 logger = logging.getLogger(__name__)
@@ -15,13 +20,192 @@ class LLMError(Exception):
     """Custom exception for LLM-related errors"""
     pass
 
-def generate(system_prompt: str, user_prompt: str) -> str:
+# Configuration, read once at import (a bad LLM_MAX_OUTPUT_CHARS fails at startup)
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL", "claude-3-5-sonnet-latest")
+LLM_MAX_OUTPUT_CHARS = int(os.getenv("LLM_MAX_OUTPUT_CHARS", "9000"))
+if not ANTHROPIC_API_KEY:
+    logger.warning("ANTHROPIC_API_KEY not set, Claude calls will fail")
+
+# Anthropic allows at most 4 cache_control breakpoints per request
+MAX_CACHE_BREAKPOINTS = 4
+
+# Upper bound on in-flight async Claude calls per process, to stay inside
+# Anthropic rate limits when many jobs run at once
+MAX_CONCURRENCY = int(os.getenv("ANTHROPIC_MAX_CONCURRENCY", "8"))
+_semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+# LRU of recent responses keyed by a hash of everything that shapes the output,
+# so identical re-runs return without a network call (0 disables)
+RESPONSE_CACHE_SIZE = int(os.getenv("LLM_RESPONSE_CACHE_SIZE", "256"))
+_response_cache: "OrderedDict[bytes, Any]" = OrderedDict()
+
+# Appended to output cut off at LLM_MAX_OUTPUT_CHARS
+TRUNCATION_NOTICE = "\n\n[Output truncated to character limit]"
+
+# Tool input JSON (keys, quotes, escaped newlines) spends more tokens than the
+# same content as plain text, so structured calls get this much extra headroom
+STRUCTURED_TOKEN_OVERHEAD = 1.25
+
+# Python types for the JSON schema "type" keywords used in tool input schemas
+_JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+}
+
+def build_system_blocks(system_prompt: str, cached_blocks: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Build the system prompt as typed text blocks with prompt-cache breakpoints
+    
+    Each breakpoint caches the whole prefix up to and including its block, so
+    the static template and the documents after it are only re-processed when
+    they change. With more blocks than breakpoints, the leading (most static)
+    blocks and the final block are marked.
+    """
+    texts = [system_prompt] + [block for block in (cached_blocks or []) if block]
+    marked = set(range(min(len(texts), MAX_CACHE_BREAKPOINTS - 1))) | {len(texts) - 1}
+    blocks = []
+    for i, text in enumerate(texts):
+        block: Dict[str, Any] = {"type": "text", "text": text}
+        if i in marked:
+            block["cache_control"] = {"type": "ephemeral"}
+        blocks.append(block)
+    return blocks
+
+def _require_api_key() -> str:
+    """Return the Anthropic API key, or raise if it is not configured"""
+    if not ANTHROPIC_API_KEY:
+        raise LLMError("ANTHROPIC_API_KEY environment variable not set")
+    return ANTHROPIC_API_KEY
+
+@functools.lru_cache(maxsize=1)
+def _get_async_client(api_key: str) -> anthropic.AsyncAnthropic:
+    """Process-wide async client, so calls reuse its pooled keep-alive connections"""
+    return anthropic.AsyncAnthropic(api_key=api_key)
+
+def _cache_key(*parts: str) -> bytes:
+    """Hash request inputs into a response cache key"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.digest()
+
+def _cache_get(key: bytes) -> Optional[Any]:
+    """Return a cached response (marking it recently used), or None"""
+    value = _response_cache.get(key)
+    if value is not None:
+        _response_cache.move_to_end(key)
+    logger.info(f"LLM response cache {'hit' if value is not None else 'miss'}")
+    return value
+
+def _cache_put(key: bytes, value: Any) -> None:
+    """Store a response, evicting the least recently used beyond RESPONSE_CACHE_SIZE"""
+    if RESPONSE_CACHE_SIZE <= 0:
+        return
+    _response_cache[key] = value
+    _response_cache.move_to_end(key)
+    while len(_response_cache) > RESPONSE_CACHE_SIZE:
+        _response_cache.popitem(last=False)
+
+def _message_params(system_prompt: str, user_prompt: str, cached_blocks: Optional[List[str]]) -> Dict[str, Any]:
+    """Keyword arguments for messages.stream / messages.create"""
+    return dict(
+        model=ANTHROPIC_MODEL,
+        max_tokens=LLM_MAX_OUTPUT_CHARS // 4,  # Rough character to token conversion
+        temperature=0.1,  # Low temperature for consistent, factual output
+        system=build_system_blocks(system_prompt, cached_blocks),
+        messages=[
+            {"role": "user", "content": user_prompt}
+        ]
+    )
+
+def _log_cache_usage(usage) -> None:
+    """Log how much of the prompt was served from the prompt cache"""
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+    prompt_tokens = usage.input_tokens + cache_read + cache_write
+    logger.info(
+        "Claude prompt cache: %d read, %d written, %d uncached input tokens (hit rate %.0f%%)",
+        cache_read, cache_write, usage.input_tokens,
+        100.0 * cache_read / prompt_tokens if prompt_tokens else 0.0,
+    )
+
+def _to_llm_error(e: APIError) -> LLMError:
+    """Map an Anthropic API exception to a sanitized LLMError"""
+    if isinstance(e, APITimeoutError):
+        logger.warning("Claude API timeout")
+        return LLMError("API request timed out. Please try again.")
+    
+    if isinstance(e, APIConnectionError):
+        logger.warning("Claude API connection error")
+        return LLMError("Failed to connect to Claude API. Please check your internet connection.")
+    
+    logger.warning(f"Claude API error: {str(e)}")
+    # Sanitize error message to avoid exposing sensitive info
+    if "authentication" in str(e).lower() or "unauthorized" in str(e).lower():
+        return LLMError("API authentication failed. Please check your ANTHROPIC_API_KEY.")
+    elif "rate limit" in str(e).lower():
+        return LLMError("API rate limit exceeded. Please try again later.")
+    else:
+        return LLMError("Claude API error occurred. Please try again.")
+
+async def agenerate_stream(system_prompt: str, user_prompt: str,
+                           cached_blocks: Optional[List[str]] = None) -> AsyncIterator[str]:
+    """
+    Stream generated text from Claude as it is produced
+    
+    Takes the same arguments as agenerate() and yields text chunks as they
+    arrive, so handlers can forward them to clients (e.g. over SSE) without
+    waiting for the full response. Output is capped at LLM_MAX_OUTPUT_CHARS.
+    
+    Raises:
+        LLMError: If API call fails or configuration is invalid
+    """
+    
+    api_key = _require_api_key()
+    
+    try:
+        # Shared client (API key not logged)
+        client = _get_async_client(api_key)
+        
+        logger.info(f"Making streaming Claude API call with model: {ANTHROPIC_MODEL}")
+        
+        generated = 0
+        async with _semaphore, client.messages.stream(
+            **_message_params(system_prompt, user_prompt, cached_blocks)
+        ) as stream:
+            async for text in stream.text_stream:
+                if generated + len(text) > LLM_MAX_OUTPUT_CHARS:
+                    # Stop reading; leaving the block closes the stream
+                    yield text[:LLM_MAX_OUTPUT_CHARS - generated] + TRUNCATION_NOTICE
+                    generated = LLM_MAX_OUTPUT_CHARS + len(TRUNCATION_NOTICE)
+                    break
+                generated += len(text)
+                yield text
+            else:
+                _log_cache_usage((await stream.get_final_message()).usage)
+        
+        if not generated:
+            raise LLMError("Empty response from Claude API")
+        logger.info(f"Claude API call successful, generated {generated} characters")
+    
+    except APIError as e:
+        raise _to_llm_error(e) from e
+
+async def agenerate(system_prompt: str, user_prompt: str, cached_blocks: Optional[List[str]] = None) -> str:
     """
     Generate content using Claude API
     
     Args:
         system_prompt: System instructions for Claude
         user_prompt: User query/request
+        cached_blocks: Large, reusable context (docs, files) sent after the system
+                       prompt with prompt caching enabled
         
     Returns:
         Generated text response
@@ -29,63 +213,144 @@ def generate(system_prompt: str, user_prompt: str) -> str:
     Raises:
         LLMError: If API call fails or configuration is invalid
     """
+    key = _cache_key("text", system_prompt, *(cached_blocks or []), user_prompt)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
     
-    # Get configuration from environment
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    if not api_key:
-        raise LLMError("ANTHROPIC_API_KEY environment variable not set")
+    generated_text = "".join([chunk async for chunk in agenerate_stream(system_prompt, user_prompt, cached_blocks)])
+    # Output cut off at LLM_MAX_OUTPUT_CHARS isn't cached, so a re-run tries again
+    if not generated_text.endswith(TRUNCATION_NOTICE):
+        _cache_put(key, generated_text)
+    return generated_text
+
+def _conform(value: Any, schema: Dict[str, Any], path: str, partial: bool) -> Any:
+    """
+    Check a tool input against its schema (types and required keys)
+    
+    Objects and arrays the model sent as JSON-encoded strings are decoded.
+    With partial=True (output cut off at max_tokens) only the tail of the
+    input can be incomplete: required keys after the last one present (in
+    schema order) may be missing, and an incomplete last array item is
+    dropped instead of failing.
+    """
+    expected = schema.get("type")
+    if expected in ("object", "array") and isinstance(value, str):
+        try:
+            value = orjson.loads(value)
+        except orjson.JSONDecodeError:
+            raise LLMError(f"Malformed structured response: {path} is not valid JSON")
+    if expected in _JSON_TYPES and not isinstance(value, _JSON_TYPES[expected]):
+        raise LLMError(f"Malformed structured response: {path} should be {expected}, got {type(value).__name__}")
+    
+    if expected == "object":
+        properties = schema.get("properties", {})
+        order = list(properties)
+        reached = max((order.index(name) for name in value if name in properties), default=-1)
+        for name in schema.get("required", []):
+            if name not in value and not (partial and name in properties and order.index(name) > reached):
+                raise LLMError(f"Malformed structured response: {path}.{name} is missing")
+        # Only the last key written before the cut can itself be incomplete
+        last = next(reversed(value), None)
+        return {
+            name: _conform(item, properties[name], f"{path}.{name}", partial and name == last)
+            if name in properties else item
+            for name, item in value.items()
+        }
+    
+    if expected == "array" and "items" in schema:
+        items = []
+        for i, item in enumerate(value):
+            try:
+                items.append(_conform(item, schema["items"], f"{path}[{i}]", False))
+            except LLMError:
+                if partial and i == len(value) - 1:
+                    break
+                raise
+        return items
+    
+    return value
+
+async def agenerate_structured(system_prompt: str, user_prompt: str, schema: Dict[str, Any],
+                               cached_blocks: Optional[List[str]] = None, max_tokens: Optional[int] = None,
+                               tool_name: str = "submit_document") -> Tuple[Dict[str, Any], bool]:
+    """
+    Generate structured output by forcing Claude to call a single tool
+    
+    Args:
+        system_prompt: System instructions for Claude
+        user_prompt: User query/request
+        schema: JSON schema for the tool input, i.e. the fields to return
+        cached_blocks: Large, reusable context sent with prompt caching enabled
+        max_tokens: Output token cap, clamped to the LLM_MAX_OUTPUT_CHARS budget
+        tool_name: Name of the tool the model must call
+        
+    Returns:
+        (data, truncated): the tool input as a dict matching the schema, and
+        whether output was cut off at the token budget (data then holds the
+        fields completed before the cut)
+        
+    Raises:
+        LLMError: If API call fails, the response doesn't match the schema,
+                  or configuration is invalid
+    """
     
-    model = os.getenv("ANTHROPIC_MODEL", "claude-3-5-sonnet-latest")
-    max_output_chars = int(os.getenv("LLM_MAX_OUTPUT_CHARS", "9000"))
+    api_key = _require_api_key()
+    
+    key = _cache_key(
+        "structured", str(max_tokens), tool_name,
+        orjson.dumps(schema, option=orjson.OPT_SORT_KEYS).decode(),
+        system_prompt, *(cached_blocks or []), user_prompt,
+    )
+    cached = _cache_get(key)
+    if cached is not None:
+        # Stored serialized, so every caller gets its own copy
+        return orjson.loads(cached), False
     
     try:
-        # Initialize client (API key not logged)
-        client = anthropic.Anthropic(api_key=api_key)
+        # Shared client (API key not logged)
+        client = _get_async_client(api_key)
+        
+        params = _message_params(system_prompt, user_prompt, cached_blocks)
+        # Bound generation up front rather than trimming billed output afterwards
+        params["max_tokens"] = int(params["max_tokens"] * STRUCTURED_TOKEN_OVERHEAD)
+        if max_tokens:
+            params["max_tokens"] = min(max_tokens, params["max_tokens"])
+        params["tools"] = [{
+            "name": tool_name,
+            "description": "Submit the completed document",
+            "input_schema": schema,
+        }]
+        params["tool_choice"] = {"type": "tool", "name": tool_name}
         
-        logger.info(f"Making Claude API call with model: {model}")
+        logger.info(f"Making structured Claude API call with model: {ANTHROPIC_MODEL}")
         
-        # Make API call
-        response = client.messages.create(
-            model=model,
-            max_tokens=max_output_chars // 4,  # Rough character to token conversion
-            temperature=0.1,  # Low temperature for consistent, factual output
-            system=system_prompt,
-            messages=[
-                {"role": "user", "content": user_prompt}
-            ]
+        # Streamed so a tool call cut off at max_tokens still yields its
+        # partially parsed input
+        async with _semaphore, client.messages.stream(**params) as stream:
+            response = await stream.get_final_message()
+        _log_cache_usage(response.usage)
+        
+        truncated = response.stop_reason == "max_tokens"
+        tool_input = next(
+            (block.input for block in response.content if block.type == "tool_use" and block.name == tool_name),
+            None,
         )
+        if not tool_input:
+            raise LLMError("Empty response from Claude API")
+        data = _conform(tool_input, schema, "input", partial=truncated)
         
-        # Extract text content
-        if response.content and len(response.content) > 0:
-            generated_text = response.content[0].text
-            
-            # Enforce character limit
-            if len(generated_text) > max_output_chars:
-                generated_text = generated_text[:max_output_chars] + "\n\n[Output truncated to character limit]"
-            
-            logger.info(f"Claude API call successful, generated {len(generated_text)} characters")
-            return generated_text
+        # Only complete responses that passed validation are cached
+        if truncated:
+            logger.warning("Structured Claude response truncated at the output token limit")
         else:
-            raise LLMError("Empty response from Claude API")
-            
-    except APITimeoutError as e:
-        logger.error("Claude API timeout")
-        raise LLMError("API request timed out. Please try again.")
-    
-    except APIConnectionError as e:
-        logger.error("Claude API connection error")
-        raise LLMError("Failed to connect to Claude API. Please check your internet connection.")
+            _cache_put(key, orjson.dumps(data))
+        logger.info(f"Claude API call successful, returned {len(data)} fields")
+        return data, truncated
     
     except APIError as e:
-        logger.error(f"Claude API error: {str(e)}")
-        # Sanitize error message to avoid exposing sensitive info
-        if "authentication" in str(e).lower() or "unauthorized" in str(e).lower():
-            raise LLMError("API authentication failed. Please check your ANTHROPIC_API_KEY.")
-        elif "rate limit" in str(e).lower():
-            raise LLMError("API rate limit exceeded. Please try again later.")
-        else:
-            raise LLMError("Claude API error occurred. Please try again.")
-    
-    except Exception as e:
-        logger.error(f"Unexpected error in LLM generation: {str(e)}")
-        raise LLMError("Unexpected error occurred during text generation.")
\ No newline at end of file
+        raise _to_llm_error(e) from e
+    except ValueError as e:
+        # The SDK raises ValueError when streamed tool input isn't parseable JSON
+        logger.warning(f"Unparseable structured response: {str(e)}")
+        raise LLMError("Malformed structured response from Claude API") from e
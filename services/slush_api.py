@@ -3,9 +3,11 @@ Slush API integration for fetching real business data
 """
 
 import os
+import time
 import logging
 import httpx
-from typing import Dict, Any, Optional
+import orjson
+from typing import Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
@@ -14,16 +16,44 @@ class SlushAPIError(Exception):
     """Custom exception for Slush API errors"""
     pass
 
+# Configuration, read once at import (trailing slash removed from the base URL)
+SLUSH_SNAPSHOT_BASE_URL = (os.getenv("SLUSH_SNAPSHOT_BASE_URL") or "").rstrip('/')
+SLUSH_SNAPSHOT_TOKEN = os.getenv("SLUSH_SNAPSHOT_TOKEN")
+if not SLUSH_SNAPSHOT_BASE_URL or not SLUSH_SNAPSHOT_TOKEN:
+    logger.warning("SLUSH_SNAPSHOT_BASE_URL/SLUSH_SNAPSHOT_TOKEN not set, memos will be generated without Slush data")
+
+# Shared client so repeated snapshot fetches reuse keep-alive connections;
+# HTTP/2 multiplexes concurrent fetches over a single TLS connection
+_http_client: Optional[httpx.AsyncClient] = None
+_HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide Slush HTTP client, creating it on first use"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(http2=True, timeout=30.0, limits=_HTTP_LIMITS)
+    return _http_client
+
+async def close_http_client():
+    """Close the shared Slush HTTP client (called on application shutdown)"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+# Formatted snapshot cache: days_back -> (fetched_at monotonic, formatted data).
+# The upstream snapshot changes at most hourly, so repeat memos within the TTL
+# skip the Slush round trip entirely.
+SNAPSHOT_CACHE_TTL = float(os.getenv("SLUSH_SNAPSHOT_CACHE_TTL", "600"))
+_snapshot_cache: Dict[int, Tuple[float, str]] = {}
+
 class SlushAPI:
     def __init__(self):
-        self.base_url = os.getenv("SLUSH_SNAPSHOT_BASE_URL")
-        self.token = os.getenv("SLUSH_SNAPSHOT_TOKEN")
-        
-        if not self.base_url or not self.token:
+        if not SLUSH_SNAPSHOT_BASE_URL or not SLUSH_SNAPSHOT_TOKEN:
             raise SlushAPIError("SLUSH_SNAPSHOT_BASE_URL and SLUSH_SNAPSHOT_TOKEN must be set")
         
-        # Remove trailing slash if present
-        self.base_url = self.base_url.rstrip('/')
+        self.base_url = SLUSH_SNAPSHOT_BASE_URL
+        self.token = SLUSH_SNAPSHOT_TOKEN
         
     async def fetch_snapshot_data(self, days_back: int = 7) -> Dict[str, Any]:
         """
@@ -37,45 +67,46 @@ class SlushAPI:
         """
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                
-                # Calculate date range
-                end_date = datetime.now()
-                start_date = end_date - timedelta(days=days_back)
-                
-                logger.info(f"Fetching Slush data from {start_date.date()} to {end_date.date()}")
-                
-                # Make API request to snapshot endpoint
-                response = await client.get(
-                    f"{self.base_url}/internal/insights/snapshot",
-                    headers={
-                        "X-Internal-Agent-Token": self.token,
-                        "Content-Type": "application/json"
-                    },
-                    params={
-                        "range": "last_7_days"
-                    }
-                )
-                
-                if response.status_code == 401:
-                    raise SlushAPIError("Invalid Slush API token")
-                elif response.status_code == 404:
-                    raise SlushAPIError("Slush snapshot endpoint not found")
-                elif response.status_code != 200:
-                    raise SlushAPIError(f"Slush API error: {response.status_code} - {response.text}")
-                
-                data = response.json()
-                logger.info(f"Successfully fetched Slush data: {len(str(data))} characters")
-                
-                return data
-                
+            client = get_http_client()
+            
+            # Calculate date range
+            end_date = datetime.now()
+            start_date = end_date - timedelta(days=days_back)
+            
+            logger.info(f"Fetching Slush data from {start_date.date()} to {end_date.date()}")
+            
+            # Make API request to snapshot endpoint
+            response = await client.get(
+                f"{self.base_url}/internal/insights/snapshot",
+                headers={
+                    "X-Internal-Agent-Token": self.token,
+                    "Content-Type": "application/json"
+                },
+                params={
+                    "range": "last_7_days"
+                }
+            )
+            
+            if response.status_code == 401:
+                raise SlushAPIError("Invalid Slush API token")
+            elif response.status_code == 404:
+                raise SlushAPIError("Slush snapshot endpoint not found")
+            elif response.status_code != 200:
+                raise SlushAPIError(f"Slush API error: {response.status_code} - {response.text}")
+            
+            data = response.json()
+            logger.info(f"Successfully fetched Slush data: {len(str(data))} characters")
+            
+            return data
+            
         except httpx.TimeoutException:
             raise SlushAPIError("Timeout connecting to Slush API")
         except httpx.RequestError as e:
             raise SlushAPIError(f"Network error connecting to Slush API: {str(e)}")
-        except Exception as e:
-            logger.error(f"Unexpected error fetching Slush data: {str(e)}")
-            raise SlushAPIError("Unexpected error occurred while fetching Slush data")
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            raise SlushAPIError(f"Error requesting Slush API: {str(e)}")
+        except ValueError:
+            raise SlushAPIError("Invalid JSON in Slush API response")
 
     def format_data_for_memo(self, raw_data: Dict[str, Any]) -> str:
         """
@@ -89,56 +120,21 @@ class SlushAPI:
         """
         
         try:
-            formatted = []
-            formatted.append("=== SLUSH BUSINESS DATA ===")
-            formatted.append(f"Data fetched: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            formatted.append("")
-            
-            # Extract key metrics if available
-            if "metrics" in raw_data:
-                metrics = raw_data["metrics"]
-                formatted.append("## Key Metrics")
-                
-                for key, value in metrics.items():
-                    if isinstance(value, dict):
-                        formatted.append(f"### {key.title()}")
-                        for subkey, subvalue in value.items():
-                            formatted.append(f"- {subkey}: {subvalue}")
-                    else:
-                        formatted.append(f"- {key}: {value}")
-                
-                formatted.append("")
+            # One C-level serialization instead of walking the payload in Python;
+            # sorted keys and no fetch-time stamp keep the output byte-stable
+            # for identical snapshots
+            snapshot_json = orjson.dumps(raw_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS).decode()
+            return (
+                "=== SLUSH BUSINESS DATA ===\n"
+                "\n"
+                "## Raw Slush Snapshot\n"
+                f"```json\n{snapshot_json}\n```"
+            )
             
-            # Extract funnel data if available
-            if "funnel" in raw_data:
-                funnel = raw_data["funnel"]
-                formatted.append("## Funnel Performance")
-                
-                for stage, data in funnel.items():
-                    formatted.append(f"### {stage.title()}")
-                    if isinstance(data, dict):
-                        for key, value in data.items():
-                            formatted.append(f"- {key}: {value}")
-                    else:
-                        formatted.append(f"- Count: {data}")
-                
-                formatted.append("")
-            
-            # Include any other top-level data
-            for key, value in raw_data.items():
-                if key not in ["metrics", "funnel"]:
-                    formatted.append(f"## {key.title()}")
-                    if isinstance(value, (dict, list)):
-                        formatted.append(f"{str(value)[:500]}{'...' if len(str(value)) > 500 else ''}")
-                    else:
-                        formatted.append(str(value))
-                    formatted.append("")
-            
-            return "\n".join(formatted)
-            
-        except Exception as e:
-            logger.error(f"Error formatting Slush data: {str(e)}")
-            return f"=== SLUSH DATA ===\n{str(raw_data)[:1000]}{'...' if len(str(raw_data)) > 1000 else ''}"
+        except orjson.JSONEncodeError as e:
+            logger.warning(f"Error formatting Slush data: {str(e)}")
+            raw_text = str(raw_data)
+            return f"=== SLUSH DATA ===\n{raw_text[:1000]}{'...' if len(raw_text) > 1000 else ''}"
 
 async def fetch_slush_data_for_memo(days_back: int = 7) -> str:
     """
@@ -151,12 +147,19 @@ async def fetch_slush_data_for_memo(days_back: int = 7) -> str:
         Formatted data string ready for Claude analysis
     """
     
+    cached = _snapshot_cache.get(days_back)
+    if cached and time.monotonic() - cached[0] < SNAPSHOT_CACHE_TTL:
+        return cached[1]
+    
     try:
         slush = SlushAPI()
         raw_data = await slush.fetch_snapshot_data(days_back)
         formatted_data = slush.format_data_for_memo(raw_data)
+        _snapshot_cache[days_back] = (time.monotonic(), formatted_data)
         return formatted_data
         
     except SlushAPIError as e:
+        # Only successful fetches are cached; drop any stale entry on failure
+        _snapshot_cache.pop(days_back, None)
         logger.warning(f"Failed to fetch Slush data: {str(e)}")
         return f"=== SLUSH DATA UNAVAILABLE ===\nError: {str(e)}\nMemo will be generated without real business data."
\ No newline at end of file
@@ -0,0 +1,186 @@
+"""
+Background job execution for Agent Ops Backend
+
+With REDIS_URL set, jobs are queued in Redis and executed by a separate ARQ
+worker process (`arq worker.WorkerSettings`), so long-running Claude calls
+neither block the API event loop nor die with an API worker restart.
+Without REDIS_URL (local development) jobs run in-process on the API event loop.
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Callable, Tuple, Set
+
+from arq import create_pool
+from arq.connections import ArqRedis, RedisSettings
+from sqlalchemy import update
+
+from db import SessionLocal, engine, init_db
+from models import Job, Output, JobStatus, JobType
+from services.slush_api import close_http_client
+from services.generators import generate_lead_list, generate_prompt_pack, generate_weekly_pilot_memo, generate_research_brief
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+# Seconds a job may run before it is marked failed
+JOB_TIMEOUT = int(os.getenv("WORKER_JOB_TIMEOUT", "600"))
+# ARQ attempts per job; a job cancelled by a worker shutdown is re-queued until these run out
+JOB_MAX_TRIES = int(os.getenv("WORKER_MAX_TRIES", "5"))
+
+# Job type -> (generator, is_async)
+_DISPATCH: Dict[JobType, Tuple[Callable[[Dict[str, Any]], Any], bool]] = {
+    JobType.LEAD_LIST: (generate_lead_list, False),  # DEPRECATED - returns notice
+    JobType.PROMPT_PACK: (generate_prompt_pack, True),
+    JobType.WEEKLY_PILOT_MEMO: (generate_weekly_pilot_memo, True),
+    JobType.RESEARCH_BRIEF: (generate_research_brief, True),
+}
+
+# Redis pool used by the API to enqueue jobs (None when running in-process)
+_queue: Optional[ArqRedis] = None
+# Strong references to in-process job tasks so they aren't garbage collected mid-run
+_local_tasks: Set[asyncio.Task] = set()
+
+async def _release_cancelled_job(job_id: str, requeue: bool, error_text: str):
+    """Move an unfinished job out of RUNNING after its task was cancelled"""
+    if requeue:
+        values = dict(status=JobStatus.QUEUED.value, started_at=None)
+    else:
+        values = dict(status=JobStatus.FAILED.value, error_text=error_text, finished_at=datetime.now(timezone.utc))
+    async with SessionLocal() as db:
+        await db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status.notin_([JobStatus.SUCCEEDED.value, JobStatus.FAILED.value]))
+            .values(**values)
+        )
+        await db.commit()
+
+async def _process_job(db, job_id: str, job_type: JobType, params: Dict[str, Any]):
+    """Claim the job, generate its content and store the output"""
+    # Claim the job with a single UPDATE ... RETURNING; finished jobs
+    # (e.g. redelivered after a worker restart) are left untouched
+    job = (await db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status.notin_([JobStatus.SUCCEEDED.value, JobStatus.FAILED.value]))
+        .values(status=JobStatus.RUNNING.value, started_at=datetime.now(timezone.utc))
+        .returning(Job)
+    )).scalar_one_or_none()
+    await db.commit()
+    if not job:
+        return
+    
+    # Generate content based on job type (sync generators run in a worker
+    # thread so the event loop keeps serving other jobs)
+    try:
+        generator, is_async = _DISPATCH[job_type]
+    except KeyError:
+        raise ValueError(f"Unknown job type: {job_type}")
+    if is_async:
+        content = await generator(params)
+    else:
+        content = await asyncio.to_thread(generator, params)
+    
+    # Store output and mark the job succeeded in one transaction
+    output = Output(
+        job_id=job_id,
+        type=job_type.value,
+        content_text=content,
+        content_type="text/markdown"
+    )
+    db.add(output)
+    job.status = JobStatus.SUCCEEDED.value
+    job.finished_at = datetime.now(timezone.utc)
+    await db.commit()
+
+async def run_job(job_id: str, job_type: JobType, params: Dict[str, Any], requeue_on_cancel: bool = False):
+    """
+    Execute a job and update its status
+    
+    A job running longer than JOB_TIMEOUT (database work included) is marked
+    failed. If the task is cancelled before that deadline (e.g. worker
+    shutdown) the job is put back to queued when it will be retried
+    (requeue_on_cancel), otherwise marked failed.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    async with SessionLocal() as db:
+        try:
+            try:
+                await asyncio.wait_for(_process_job(db, job_id, job_type, params), JOB_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise RuntimeError(f"Job timed out after {JOB_TIMEOUT} seconds")
+        
+        except Exception as e:
+            # Update job to failed
+            await db.rollback()
+            await db.execute(
+                update(Job)
+                .where(Job.id == job_id)
+                .values(status=JobStatus.FAILED.value, error_text=str(e), finished_at=datetime.now(timezone.utc))
+            )
+            await db.commit()
+            logger.exception(f"Job {job_id} failed: {str(e)}")
+        
+        except asyncio.CancelledError:
+            # CancelledError isn't an Exception, so without this the row would
+            # stay RUNNING forever; shielded so the write survives the cancellation.
+            # Past the deadline the cancel is ARQ's job_timeout, which ARQ does
+            # not retry, so the job must not go back to queued.
+            if loop.time() - started >= JOB_TIMEOUT:
+                requeue, error_text = False, f"Job timed out after {JOB_TIMEOUT} seconds"
+            else:
+                requeue, error_text = requeue_on_cancel, "Job was cancelled before completing"
+            logger.warning(f"Job {job_id} cancelled: {error_text if not requeue else 're-queued for retry'}")
+            await asyncio.shield(_release_cancelled_job(job_id, requeue, error_text))
+            raise
+
+async def execute_job(ctx: Dict[str, Any], job_id: str, job_type: str, params: Dict[str, Any]):
+    """ARQ task entry point"""
+    # ARQ re-runs jobs cancelled by a shutdown until max_tries is reached
+    await run_job(job_id, JobType(job_type), params, requeue_on_cancel=ctx.get("job_try", 1) < JOB_MAX_TRIES)
+
+async def init_queue():
+    """Connect to the Redis job queue if configured"""
+    global _queue
+    if REDIS_URL:
+        _queue = await create_pool(RedisSettings.from_dsn(REDIS_URL))
+    else:
+        logger.info("REDIS_URL not set, jobs will run in-process")
+
+async def close_queue():
+    """Close the Redis job queue connection"""
+    global _queue
+    if _queue is not None:
+        await _queue.aclose()
+        _queue = None
+
+async def enqueue_job(job_id: str, job_type: JobType, params: Dict[str, Any]):
+    """Hand a job to the worker queue, or run it in-process when no queue is configured"""
+    if _queue is not None:
+        # The job id doubles as the ARQ job id so a job can't be queued twice
+        await _queue.enqueue_job("execute_job", job_id, job_type.value, params, _job_id=job_id)
+    else:
+        task = asyncio.create_task(run_job(job_id, job_type, params))
+        _local_tasks.add(task)
+        task.add_done_callback(_local_tasks.discard)
+
+async def _worker_startup(ctx: Dict[str, Any]):
+    logging.basicConfig(level=logging.INFO)
+    await init_db()
+
+async def _worker_shutdown(ctx: Dict[str, Any]):
+    await close_http_client()
+    await engine.dispose()
+
+class WorkerSettings:
+    """ARQ worker configuration: `arq worker.WorkerSettings`"""
+    functions = [execute_job]
+    redis_settings = RedisSettings.from_dsn(REDIS_URL) if REDIS_URL else RedisSettings()
+    on_startup = _worker_startup
+    on_shutdown = _worker_shutdown
+    max_jobs = int(os.getenv("WORKER_MAX_JOBS", "10"))
+    # Backstop only: run_job enforces JOB_TIMEOUT itself and records the failure
+    job_timeout = JOB_TIMEOUT + 30
+    max_tries = JOB_MAX_TRIES